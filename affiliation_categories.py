@@ -0,0 +1,83 @@
+"""
+Affiliation categories used to sort the publications of the consortium list.
+
+The categories are checked in the order of CATEGORIES. The first category which matches
+one of the affiliations of a publication is the one it is sorted into.
+"""
+import re
+
+
+university_basel = re.compile('(universit(y|ies) (of )?bas(el|le)|bas(el|le) university)'
+                              '|(universit([äa]|ae)t basel'
+                              '|basel universit([äa]|ae)t)', re.IGNORECASE)
+
+university_hospital_basel = re.compile('(universit([äa]|ae)tsspital basel)'
+                                       '|(university women\'s clinic basel)'
+                                       '|(university (children\'s )?(hospital[s]?'
+                                       '|clinic[s]?)[,]? (of )?basel)'
+                                       '|(basel university hospital)'
+                                       '|(university-hosp\. basel)'
+                                       '|(((university hospital)|universitätsklinik(en)?|universitiitsklinik).+basel)'
+                                       '|(university hospital, basel)', re.IGNORECASE)
+
+canton_hospital_basel = re.compile('(canton hospital[,]? basel)'
+                                   '|(kantonsspital basel)'
+                                   '|kantonsspital[s]?.+basel', re.IGNORECASE)
+
+biozentrum = re.compile('biozentrum.+basel', re.IGNORECASE)
+institute_of_botany = re.compile('institute of botany.+basel', re.IGNORECASE)
+friedrich_miescher = re.compile('friedrich[\- ]miescher[ \-]institut[e]?', re.IGNORECASE)
+
+
+sti = re.compile('(swiss tropical (and public health )?institute)|(swiss tph)', re.IGNORECASE)
+
+email = re.compile('@unibas\.ch', re.IGNORECASE)
+basel_address = re.compile('bernouuianum'
+                           '|schönbeinstr(\.|asse)'
+                           '|rheinsprung[ ]?9'
+                           '|petersgraben 9'
+                           '|nadelberg 6', re.IGNORECASE)
+
+university_hospital_not_in_basel = re.compile('university hospital', re.IGNORECASE)
+private_industry = re.compile('novartis|ciba-geigy|ciba|geigy|sandoz|'
+                              'roche |hoffmann[\- ]la[ ]?roche|actelion|'
+                              'basel institute for immunology|syngenta|'
+                              'healthecon ag, basel|basilea pharma|center for outcomes research', re.IGNORECASE)
+
+unaffiliated_institutes = re.compile('(basel university medical clinic)'
+                                     '|(zürich-basel)'
+                                     '|(swiss institute of bioinformatics)', re.IGNORECASE)
+other_universities = re.compile('university of zurich'
+                                '|université de lausanne'
+                                '|rockefeller university'
+                                '|university of california', re.IGNORECASE)
+
+fachhochschule_basel = re.compile('university of applied sciences basel', re.IGNORECASE)
+
+
+# (category name, regex) ordered by priority.
+CATEGORIES = [
+    ('uni-basel', university_basel),
+    ('unispital-basel', university_hospital_basel),
+    ('kantons-spital-basel', canton_hospital_basel),
+    ('biozentrum', biozentrum),
+    ('friedrich-miescher', friedrich_miescher),
+    ('institute-of-botany', institute_of_botany),
+    ('swiss-tropical-institute', sti),
+    ('address-in-basel', basel_address),
+    ('unispital-not-in-basel', university_hospital_not_in_basel),
+    ('private-industry', private_industry),
+    ('unaffiliated-institutes', unaffiliated_institutes),
+    ('other-unis', other_universities),
+    ('fachhochschule-basel', fachhochschule_basel),
+    ('email', email)
+]
+
+
+def check_affiliations(all_affiliations):
+    """Returns the first (category, affiliation) which matches or None."""
+    for name, regex in CATEGORIES:
+        for affil in all_affiliations:
+            if regex.search(affil):
+                return name, affil
+    return None
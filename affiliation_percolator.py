@@ -0,0 +1,268 @@
+from elasticsearch import Elasticsearch
+from affiliation_categories import CATEGORIES, check_affiliations
+
+import re
+import logging
+
+
+# characters which are operators in the lucene regexp syntax, but not in python.
+LUCENE_RESERVED = '@&~<>#"'
+
+# repetitions supported by lucene and all braces python reads as a repetition instead of literals.
+LUCENE_REPETITION = re.compile(r'\{\d+(,\d*)?\}')
+PYTHON_REPETITION = re.compile(r'\{\d*,\d*\}|\{\d+\}')
+
+
+class PercolateError(Exception):
+    """Raised when elastic could not percolate the affiliations of a publication."""
+
+
+def lucene_regexp(pattern):
+    """
+    Translates a python regex of the affiliation categories into a lucene regexp.
+
+    Lucene regexps are always anchored and match the whole term. The pattern is therefore wrapped
+    in .* to behave like re.search. The normalizer of the index lowercases the affiliations, but not
+    the query, so the pattern is lowercased as well to behave like re.IGNORECASE.
+
+    Raises a ValueError for python constructs lucene does not support (character class escapes like
+    \\s or \\d, ^ and $ anchors, (?...) groups and flags, lazy quantifiers, {,n} repetitions), as lucene
+    would silently read them differently. Braces python reads as literals are escaped.
+    """
+    escaped = ''
+    is_escaped = False
+    in_class = False
+    class_content = ''
+    previous = ''
+    in_repetition = False
+    for position, char in enumerate(pattern):
+        is_literal = False
+        if is_escaped:
+            if char.isascii() and char.isalnum():
+                raise ValueError('Escape \\{} is not supported by lucene: {}'.format(char, pattern))
+        elif in_class:
+            if char == ']' and class_content not in ('', '^'):
+                in_class = False
+            class_content += char
+        elif char in '^$':
+            raise ValueError('Anchor {} is not supported by lucene: {}'.format(char, pattern))
+        elif char == '?' and previous == '(':
+            raise ValueError('Groups and flags with (? are not supported by lucene: {}'.format(pattern))
+        elif char in '?+' and previous in ('*', '+', '?', '}'):
+            raise ValueError('Lazy or possessive quantifiers are not supported by lucene: {}'.format(pattern))
+        elif char == '[':
+            in_class = True
+            class_content = ''
+        elif char == '{':
+            if LUCENE_REPETITION.match(pattern, position):
+                in_repetition = True
+            elif PYTHON_REPETITION.match(pattern, position):
+                raise ValueError('Repetition {} is not supported by lucene: {}'.format(
+                    PYTHON_REPETITION.match(pattern, position).group(), pattern))
+            else:
+                escaped += '\\'
+                is_literal = True
+        elif char == '}':
+            if in_repetition:
+                in_repetition = False
+            else:
+                escaped += '\\'
+                is_literal = True
+
+        if char in LUCENE_RESERVED and not is_escaped:
+            escaped += '\\'
+        escaped += char
+        previous = '' if is_escaped or in_class or is_literal else char
+        is_escaped = char == '\\' and not is_escaped
+    # escapes of letters are rejected above, so lowercasing cannot change their meaning.
+    return '.*(' + escaped.lower() + ').*'
+
+
+class AffiliationPercolator:
+    """
+    Classifies affiliations with percolator queries stored in elastic.
+
+    Each category is stored as a regexp query with its priority (lower is more important).
+    The affiliations of each publication are percolated against these queries and the
+    category with the highest priority is returned.
+    """
+
+    def __init__(self, index='affiliation-categories', doc_type='_doc', es=None, elastic_url='http://localhost:9200',
+                 fake=False, batch_size=500, logger=logging.getLogger('natlic')):
+        self.index = index
+        self.doc_type = doc_type
+        self.batch_size = batch_size
+        self.logger = logger
+
+        if es:
+            self.es = es
+        elif fake:
+            self.es = FakePercolatorElasticsearch()
+        else:
+            self.es = Elasticsearch([elastic_url], timeout=300)
+
+    def _mapping(self):
+        return {
+            self.doc_type: {
+                'properties': {
+                    'query': {'type': 'percolator'},
+                    'affiliation': {'type': 'keyword', 'normalizer': 'lowercase_normalizer'},
+                    'category': {'type': 'keyword'},
+                    'priority': {'type': 'integer'}
+                }
+            }
+        }
+
+    @staticmethod
+    def _settings():
+        return {
+            'number_of_shards': 1,
+            'number_of_replicas': 0,
+            'analysis': {
+                'normalizer': {
+                    'lowercase_normalizer': {'type': 'custom', 'filter': ['lowercase']}
+                }
+            }
+        }
+
+    def register_categories(self, categories=None, recreate=False):
+        """
+        Creates the percolator index and stores a query for each category.
+
+        An existing index is left untouched, so that categories edited on the server are kept.
+
+        :param categories:  List of (name, regex) tuples ordered by priority. Defaults to CATEGORIES.
+        :param recreate:    Delete an existing index and register the categories again.
+        """
+        if categories is None:
+            categories = CATEGORIES
+        if self.es.indices.exists(index=self.index):
+            if not recreate:
+                self.logger.info('Index %s already exists. Categories are not registered.', self.index)
+                return
+            self.es.indices.delete(index=self.index)
+        self.es.indices.create(index=self.index, body={'mappings': self._mapping(), 'settings': self._settings()})
+
+        for priority, (name, regex) in enumerate(categories):
+            document = {
+                'query': {'regexp': {'affiliation': {'value': lucene_regexp(regex.pattern)}}},
+                'category': name,
+                'priority': priority
+            }
+            self.es.index(index=self.index, doc_type=self.doc_type, id=name, body=document)
+        self.es.indices.refresh(index=self.index)
+        self.logger.info('Registered %s categories in index %s.', len(categories), self.index)
+
+    def _percolate_body(self, affiliations):
+        return {
+            'query': {
+                'percolate': {
+                    'field': 'query',
+                    'documents': [{'affiliation': affiliation} for affiliation in affiliations]
+                }
+            },
+            'sort': [{'priority': 'asc'}],
+            '_source': ['category', 'priority'],
+            'size': 1
+        }
+
+    def classify(self, publications):
+        """
+        Classifies the affiliations of many publications with batched _msearch requests.
+
+        :param publications:    List of affiliation lists. One list per publication.
+        :return:                List with a (category, affiliation) tuple per publication or None
+                                if no category matched.
+        :raises PercolateError: If elastic returns an error for any publication.
+        """
+        results = list()
+        for start in range(0, len(publications), self.batch_size):
+            batch = publications[start:start + self.batch_size]
+            body = list()
+            for affiliations in batch:
+                body.append({'index': self.index})
+                body.append(self._percolate_body(affiliations))
+            self.logger.info('Percolate %s publications against index %s.', len(batch), self.index)
+            response = self.es.msearch(body=body)
+
+            for affiliations, result in zip(batch, response['responses']):
+                if 'error' in result:
+                    raise PercolateError('Could not percolate {}: {}'.format(affiliations, result['error']))
+                if len(result['hits']['hits']) == 0:
+                    results.append(None)
+                else:
+                    hit = result['hits']['hits'][0]
+                    slot = hit['fields']['_percolator_document_slot'][0]
+                    results.append((hit['_source']['category'], affiliations[slot]))
+        return results
+
+
+class FakePercolatorElasticsearch:
+    """
+    Minimal in-memory replacement of the elastic client for the percolator.
+
+    Only supports the calls made by AffiliationPercolator. The stored regexp queries are
+    evaluated with python re against the lower cased affiliations, not with lucene. It checks
+    the classification logic, not how lucene reads the translated patterns.
+    """
+
+    def __init__(self):
+        self.data = dict()
+        self.indices = _FakeIndices(self.data)
+
+    def index(self, index, doc_type, id, body):
+        self.data[index][id] = body
+
+    def msearch(self, body):
+        responses = list()
+        for header, search in zip(body[::2], body[1::2]):
+            documents = search['query']['percolate']['documents']
+            hits = list()
+            for stored in self.data[header['index']].values():
+                regexp = re.compile(stored['query']['regexp']['affiliation']['value'], re.DOTALL)
+                slots = [slot for slot, document in enumerate(documents)
+                         if regexp.fullmatch(document['affiliation'].lower())]
+                if slots:
+                    hits.append({'_source': {'category': stored['category'], 'priority': stored['priority']},
+                                 'fields': {'_percolator_document_slot': slots}})
+            hits.sort(key=lambda hit: hit['_source']['priority'])
+            responses.append({'hits': {'total': len(hits), 'hits': hits[:search['size']]}})
+        return {'responses': responses}
+
+
+class _FakeIndices:
+
+    def __init__(self, data):
+        self.data = data
+
+    def exists(self, index):
+        return index in self.data
+
+    def create(self, index, body=None):
+        self.data[index] = dict()
+
+    def delete(self, index):
+        del self.data[index]
+
+    def refresh(self, index):
+        pass
+
+
+if __name__ == '__main__':
+    # compares the fake percolator with the regex backend on the consortium list.
+    from openpyxl import load_workbook
+    import sys
+
+    sheet = load_workbook('unibas.xlsx').active
+    publications = [row[11].value.split(';') for row in sheet.iter_rows(min_row=2, max_col=28)]
+
+    percolator = AffiliationPercolator(fake=True)
+    percolator.register_categories()
+    differences = 0
+    for affiliations, percolated in zip(publications, percolator.classify(publications)):
+        expected = check_affiliations(affiliations)
+        if percolated != expected:
+            differences += 1
+            print('Regex: {} Percolator: {} Affiliations: {}'.format(expected, percolated, affiliations))
+    print('{} of {} publications classified differently.'.format(differences, len(publications)))
+    sys.exit(1 if differences else 0)